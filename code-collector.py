@@ -1,14 +1,33 @@
 #!/usr/bin/env python3
 import os
+import re
 import fnmatch # For filename pattern matching
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor # For overlapping file reads
+
+try:
+    import re2 # Optional: Google RE2 bindings (pip install google-re2) for glob matching
+except ImportError:
+    re2 = None
+if re2 is not None and not (hasattr(re2, "Options") and hasattr(re2, "error")):
+    re2 = None # Another package that also installs as 're2' (e.g. pyre2), not the API used here
 
 # --- Configuration ---
 CONFIG_FILENAME = ".code_collector_ignore"
 OUTPUT_FILENAME = "collected_code.txt"
 ROOT_DIR = "."  # Run from the current directory
-
-# Default ignored folders (case-sensitive on Linux/macOS, insensitive on Windows often)
-# Using lowercase for broader matching potential if needed later, but direct comparison is fine for now.
+# Number of threads reading files concurrently (file reads release the GIL)
+MAX_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Reads allowed to run ahead of the writer, which bounds how many file contents are held in memory
+MAX_READ_AHEAD = 2 * MAX_READ_WORKERS
+OUTPUT_BUFFER_SIZE = 1024 * 1024  # 1 MiB write buffer for the output file
+# Files larger than this (in bytes) are skipped, e.g. minified bundles or vendored blobs.
+# Can be overridden in the [LIMITS] section of the config file; 0 disables the limit.
+MAX_FILE_SIZE = 1024 * 1024
+# Files with a NUL byte in their first BINARY_SNIFF_SIZE bytes are treated as binary and skipped
+BINARY_SNIFF_SIZE = 512
+
+# Default ignored folders (matched case-insensitively against folder names, on every platform)
 DEFAULT_IGNORED_FOLDERS = {
     "node_modules",
     "build",
@@ -80,14 +99,155 @@ DEFAULT_IGNORED_PATTERNS = {
 }
 # --- End Configuration ---
 
-def load_ignore_config(config_path, default_folders, default_patterns):
-    """Loads ignore patterns from a config file, combining with defaults."""
-    ignored_folders = set(default_folders)
+# Separator line written above and below each file's header in the output
+FILE_SEPARATOR = "=" * 70 + "\n"
+# Pre-encoded header pieces around the file path, since the output is written as bytes
+FILE_HEADER_PREFIX = (FILE_SEPARATOR + "File: ").encode('utf-8')
+FILE_HEADER_SUFFIX = ("\n" + FILE_SEPARATOR).encode('utf-8')
+
+# Upper bound on the size of a single combined ignore regex. Very large
+# alternations can overflow the re engine, so they are split into chunks.
+MAX_REGEX_CHUNK_SIZE = 20000
+
+# RE2 (if installed) is used once there are at least this many glob patterns. It matches a
+# combined pattern in one linear pass however many globs it holds, but its per-call overhead
+# makes Python's re faster for only a handful of them.
+RE2_MIN_GLOB_PATTERNS = 10
+RE2_MAX_MEM = 64 * 1024 * 1024 # Lets RE2 build its DFA for a full-size chunk
+
+# Characters that make a pattern a real glob rather than a literal name
+GLOB_SPECIAL_CHARS = re.compile(r"[*?\[]")
+
+def min_match_length(pattern):
+    """Returns the length of the shortest filename a glob pattern can match."""
+    length = 0
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            continue
+        if c == '[':
+            # Mirror fnmatch: a bracket without a closing ']' is a literal '['
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j < n:
+                i = j + 1
+        length += 1 # Literal character, '?' or a whole [seq] each match exactly one character
+    return length
+
+def compile_glob_patterns(glob_patterns):
+    """Compiles lowercase glob patterns into a short list of combined regexes, broadest patterns first."""
+    glob_patterns = sorted(glob_patterns, key=lambda p: (min_match_length(p), p))
+    if re2 is not None and len(glob_patterns) >= RE2_MIN_GLOB_PATTERNS:
+        # RE2 objects are a drop-in here: is_ignored only calls .match()
+        try:
+            return join_regexes([glob_to_re2(p) for p in glob_patterns], compile_re2)
+        except (re2.error, AttributeError, TypeError):
+            # Syntax RE2 rejects (e.g. reversed [z-a] ranges) or an incompatible binding
+            pass # Use Python's re instead
+    return join_regexes([fnmatch.translate(p) for p in glob_patterns], re.compile)
+
+def join_regexes(translated_patterns, compile_regex):
+    """Joins translated patterns into alternations of at most MAX_REGEX_CHUNK_SIZE characters."""
+    regexes = []
+    chunk = []
+    chunk_size = 0
+    for translated in translated_patterns:
+        if chunk and chunk_size + len(translated) + 1 > MAX_REGEX_CHUNK_SIZE:
+            regexes.append(compile_regex("|".join(chunk)))
+            chunk = []
+            chunk_size = 0
+        chunk.append(translated)
+        chunk_size += len(translated) + 1
+    if chunk:
+        regexes.append(compile_regex("|".join(chunk)))
+    return regexes
+
+def glob_to_re2(pattern):
+    """
+    Translates a glob pattern to RE2 syntax, following fnmatch's rules. fnmatch.translate
+    can't be reused: its output relies on constructs RE2 doesn't support (atomic groups, \\Z).
+    """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            if not parts or parts[-1] != '.*': # Collapse runs of '*'
+                parts.append('.*')
+        elif c == '?':
+            parts.append('.')
+        elif c == '[':
+            # Same bracket scan as fnmatch: without a closing ']' the '[' is a literal
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                parts.append('\\[')
+                continue
+            stuff = pattern[i:j]
+            i = j + 1
+            negate = stuff.startswith('!')
+            if negate:
+                stuff = stuff[1:]
+            stuff = stuff.replace('\\', '\\\\').replace('[', '\\[')
+            if stuff.startswith((']', '^')):
+                stuff = '\\' + stuff
+            parts.append('[' + ('^' if negate else '') + stuff + ']')
+        else:
+            parts.append(re.escape(c))
+    return '(?:' + ''.join(parts) + ')'
+
+def compile_re2(alternation):
+    """Compiles an alternation of glob_to_re2 patterns into an RE2 regex anchored at both ends."""
+    options = re2.Options()
+    options.dot_nl = True # Like fnmatch, '*' and '?' also match newlines
+    options.never_capture = True
+    options.log_errors = False # Failures surface as re2.error instead of stderr noise
+    options.max_mem = RE2_MAX_MEM
+    return re2.compile('(?:' + alternation + ')\\z', options=options)
+
+def compile_ignore_patterns(ignored_patterns):
+    """
+    Splits the (lowercase) ignore patterns into buckets that can be checked cheaply:
+    exact filenames (e.g. 'yarn.lock'), plain suffixes (e.g. '*.jpg' -> '.jpg')
+    and the remaining true globs, which are compiled into combined regexes. Also returns
+    the shortest name any of those globs can match, so shorter names can skip them.
+    """
+    exact_names = set()
+    suffixes = set()
+    glob_patterns = []
+    for pattern in ignored_patterns:
+        if not GLOB_SPECIAL_CHARS.search(pattern):
+            exact_names.add(pattern)
+        elif pattern.startswith('*') and len(pattern) > 1 and not GLOB_SPECIAL_CHARS.search(pattern, 1):
+            suffixes.add(pattern[1:])
+        else:
+            glob_patterns.append(pattern)
+    min_glob_length = min((min_match_length(p) for p in glob_patterns), default=0)
+    return (frozenset(exact_names), tuple(sorted(suffixes)),
+            compile_glob_patterns(glob_patterns), min_glob_length)
+
+def load_ignore_config(config_path, default_folders, default_patterns, default_max_file_size):
+    """Loads ignore patterns and size limits from a config file, combining with defaults."""
+    ignored_folders = set(f.lower() for f in default_folders) # Store lowercase
     ignored_patterns = set(p.lower() for p in default_patterns) # Store lowercase
+    max_file_size = default_max_file_size
 
     if not os.path.exists(config_path):
         print(f"Info: Config file '{config_path}' not found. Using default ignore lists.")
-        return ignored_folders, ignored_patterns
+        return frozenset(ignored_folders), ignored_patterns, compile_ignore_patterns(ignored_patterns), max_file_size
 
     print(f"Info: Loading ignore configuration from '{config_path}'...")
     try:
@@ -104,6 +264,9 @@ def load_ignore_config(config_path, default_folders, default_patterns):
                 elif line.lower() == '[patterns]': # Changed from [EXTENSIONS] to [PATTERNS]
                     current_section = 'patterns'
                     continue
+                elif line.lower() == '[limits]':
+                    current_section = 'limits'
+                    continue
                 elif line.startswith('[') and line.endswith(']'):
                     # Handle unknown sections if needed, or just ignore
                     print(f"  Warning: Unknown section '{line}' in config file at line {line_num}. Ignoring.")
@@ -112,30 +275,113 @@ def load_ignore_config(config_path, default_folders, default_patterns):
 
 
                 if current_section == 'folders':
-                    ignored_folders.add(line)
+                    ignored_folders.add(line.lower())
                     # print(f"  Ignoring folder: {line}") # Optional debug print
                 elif current_section == 'patterns':
                     ignored_patterns.add(line.lower())
                     # print(f"  Ignoring pattern: {line.lower()}") # Optional debug print
+                elif current_section == 'limits':
+                    key, sep, value = line.partition('=')
+                    key = key.strip().lower()
+                    if sep and key == 'max_file_size':
+                        try:
+                            limit = int(value.strip())
+                        except ValueError:
+                            limit = -1
+                        if limit >= 0:
+                            max_file_size = limit
+                        else:
+                            print(f"  Warning: Invalid max_file_size '{value.strip()}' at line {line_num}. Ignoring.")
+                    else:
+                        print(f"  Warning: Unknown limit '{line}' in config file at line {line_num}. Ignoring.")
                 # else: No current section, ignore line unless it's a section header
 
 
     except IOError as e:
         print(f"Warning: Could not read config file '{config_path}': {e}. Using defaults.")
-        return set(default_folders), set(p.lower() for p in default_patterns) # Revert to defaults on error
+        # Revert to defaults on error
+        ignored_folders = set(f.lower() for f in default_folders)
+        ignored_patterns = set(p.lower() for p in default_patterns)
+        max_file_size = default_max_file_size
+        return frozenset(ignored_folders), ignored_patterns, compile_ignore_patterns(ignored_patterns), max_file_size
 
     print("Info: Ignore configuration loaded successfully.")
-    return ignored_folders, ignored_patterns
+    return frozenset(ignored_folders), ignored_patterns, compile_ignore_patterns(ignored_patterns), max_file_size
 
-def is_ignored(filename, ignored_patterns):
-    """Check if a filename matches any of the ignored patterns (case-insensitive)."""
+def is_ignored(filename, ignore_matcher):
+    """Check if a filename matches any of the compiled ignore patterns (case-insensitive)."""
+    exact_names, suffixes, glob_regexes, min_glob_length = ignore_matcher
     filename_lower = filename.lower()
-    for pattern in ignored_patterns:
-        if fnmatch.fnmatch(filename_lower, pattern):
+    if filename_lower in exact_names or filename_lower.endswith(suffixes):
+        return True
+    if len(filename_lower) < min_glob_length:
+        return False # Too short for any of the glob patterns to match
+    for regex in glob_regexes:
+        if regex.match(filename_lower) is not None:
             return True
     return False
 
-def collect_code(root_dir, output_file, ignored_folders, ignored_patterns):
+def walk_files(current_dir, ignored_folders, rel_prefix=''):
+    """Recursively yields (os.DirEntry, relative_path) pairs for files, skipping ignored folders."""
+    subdirs = []
+    try:
+        with os.scandir(current_dir) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    yield entry, rel_prefix + entry.name
+                elif entry.name.lower() not in ignored_folders and not entry.is_symlink():
+                    subdirs.append(entry)
+    except OSError:
+        return # Unreadable directory (permissions etc.), skip it like os.walk does
+
+    for subdir in subdirs:
+        yield from walk_files(subdir.path, ignored_folders, rel_prefix + subdir.name + '/')
+
+def read_file_content(file_path):
+    """Returns (utf8_bytes, encoding_used, error) for a file, or (None, 'binary', None) for binary files."""
+    try:
+        with open(file_path, 'rb') as infile:
+            # peek() fills the read buffer without consuming it, so the full read below
+            # reuses those bytes instead of reading them again
+            if b'\x00' in infile.peek(BINARY_SNIFF_SIZE)[:BINARY_SNIFF_SIZE]:
+                return None, 'binary', None
+            data = infile.read()
+    except Exception as e: # Catch file reading errors (permissions etc.)
+        return None, None, e
+
+    try:
+        data.decode('utf-8') # Validation only, the original bytes are written
+        encoding_used = 'utf-8'
+    except UnicodeDecodeError:
+        data = data.decode('latin-1').encode('utf-8') # Every byte is valid latin-1, this cannot fail
+        encoding_used = 'latin-1'
+
+    # Translate '\r\n' and '\r' line endings to '\n' like text-mode reading does.
+    # Safe on UTF-8 bytes: b'\r' never occurs inside a multi-byte sequence.
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    return data, encoding_used, None
+
+def read_files_ahead(file_paths):
+    """
+    Yields read_file_content results for file_paths in order, reading them in worker threads.
+    Only MAX_READ_AHEAD reads are submitted ahead of the caller, so the reader threads can't
+    pile up the whole tree's contents in memory while the caller is still writing.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_READ_WORKERS) as executor:
+        pending = deque()
+        for file_path in file_paths:
+            if len(pending) >= MAX_READ_AHEAD:
+                yield pending.popleft().result()
+            pending.append(executor.submit(read_file_content, file_path))
+        while pending:
+            yield pending.popleft().result()
+
+def collect_code(root_dir, output_file, ignored_folders, ignored_patterns, ignore_matcher, max_file_size):
     """Traverses directories, reads code files, and appends to the output file."""
     collected_count = 0
     abs_root_dir = os.path.abspath(root_dir)
@@ -159,101 +405,99 @@ def collect_code(root_dir, output_file, ignored_folders, ignored_patterns):
     print("-" * 70)
     print("Ignored Folders:", ", ".join(sorted(list(ignored_folders))) if ignored_folders else "None")
     print("Ignored Patterns:", ", ".join(sorted(list(ignored_patterns))) if ignored_patterns else "None")
+    print("Max File Size:", f"{max_file_size} bytes" if max_file_size > 0 else "No limit")
     print("-" * 70)
 
 
-    try:
-        with open(output_file, 'w', encoding='utf-8') as outfile:
-            # Use abs_root_dir for traversal start to ensure relpath works correctly even if root_dir='.'
-            for current_dir, dirs, files in os.walk(abs_root_dir, topdown=True):
-                # --- Folder Exclusion ---
-                # Compare basenames for exclusion
-                dirs[:] = [d for d in dirs if os.path.basename(d) not in ignored_folders]
-
-                # --- Current Directory Check ---
-                # Need to check if the *current directory itself* should be skipped.
-                # We need to compare the *name* of the directory being entered.
-                # os.walk yields the *path* to the directory (current_dir).
-                current_dir_basename = os.path.basename(current_dir)
-                # Avoid skipping the root folder itself based on its name if it's the starting point
-                if current_dir != abs_root_dir and current_dir_basename in ignored_folders:
-                    # If we skip here, os.walk won't descend further, but modifying dirs[:]
-                    # is the primary mechanism for pruning *before* descending.
-                    # This adds an extra layer but might be redundant if dirs[:] works perfectly.
-                    # print(f"Skipping traversal into ignored directory: {os.path.relpath(current_dir, abs_root_dir)}")
-                    continue
+    # Absolute paths of the script itself, its config and its output, which are never collected.
+    # Entries yielded by walk_files already carry absolute paths, so no per-file abspath is needed.
+    skip_paths = frozenset(map(os.path.abspath, [
+        __file__,
+        OUTPUT_FILENAME,
+        os.path.join(ROOT_DIR, CONFIG_FILENAME),
+    ]))
 
+    # Prefix prepended to every relative path in the output file.
+    # If root_folder_name is empty (e.g. running from '/') or '.', just use the relative path
+    if root_folder_name and root_folder_name != '.':
+        display_prefix = root_folder_name + '/'
+    else:
+        display_prefix = ''
 
-                for filename in files:
-                    # --- File Exclusion ---
-                    file_path = os.path.join(current_dir, filename)
-                    # Calculate path relative to the *absolute* root directory now
-                    relative_path = os.path.relpath(file_path, abs_root_dir)
+    try:
+        # Binary mode: file contents arrive as UTF-8 bytes and skip the text encoder.
+        # A large buffer keeps the number of flushes to the OS low.
+        with open(output_file, 'wb', buffering=OUTPUT_BUFFER_SIZE) as outfile:
+            # --- Traversal: collect the files to process ---
+            candidates = []
+            # Bind globals and bound methods used per file to locals for faster lookups in the loops below
+            add_candidate = candidates.append
+            check_ignored = is_ignored
+            write = outfile.write
+            header_prefix, header_suffix = FILE_HEADER_PREFIX, FILE_HEADER_SUFFIX
+            # Use abs_root_dir for traversal start so every entry.path is absolute, even if root_dir='.'
+            for entry, relative_path in walk_files(abs_root_dir, ignored_folders):
+                # --- File Exclusion ---
+                filename = entry.name
+                file_path = entry.path
+
+                # --- Ignore self/config/output files ---
+                if file_path in skip_paths:
+                    continue
 
-                    # --- Construct the Desired Output Path ---
-                    # Prepend the root folder's name to the relative path
-                    # os.path.join handles cases where relative_path might be '.' or just the filename
-                    if root_folder_name and root_folder_name != '.':
-                        output_display_path = os.path.join(root_folder_name, relative_path)
-                    else:
-                         # If root_folder_name is empty (e.g. running from '/') or '.', just use relative path
-                         output_display_path = relative_path
-
-                    # Ensure consistent forward slashes for output
-                    output_display_path = output_display_path.replace(os.sep, '/')
-
-                    # --- Ignore self/config/output files ---
-                    # Check absolute paths to be safe
-                    abs_file_path = os.path.abspath(file_path)
-                    if abs_file_path == os.path.abspath(os.path.join(ROOT_DIR, CONFIG_FILENAME)) or \
-                       abs_file_path == os.path.abspath(__file__) or \
-                       abs_file_path == os.path.abspath(OUTPUT_FILENAME) :
-                        continue
+                # Check ignored patterns (using the base filename)
+                if check_ignored(filename, ignore_matcher):
+                    # print(f"Skipping ignored pattern match: {display_prefix + relative_path}") # Debug
+                    continue
 
-                    # Check ignored patterns (using the base filename)
-                    if is_ignored(filename, ignored_patterns):
-                        # print(f"Skipping ignored pattern match: {output_display_path}") # Debug
+                # Skip files over the size limit before reading them.
+                # A failed stat is left for the read to report.
+                if max_file_size > 0:
+                    try:
+                        file_size = entry.stat().st_size
+                    except OSError:
+                        file_size = 0
+                    if file_size > max_file_size:
+                        print(f"Skipping large file: {display_prefix + relative_path} ({file_size} bytes)")
                         continue
 
-                    # --- File Processing ---
-                    print(f"Processing: {output_display_path}") # Use the new path for logging too
+                # --- Construct the Desired Output Path ---
+                # relative_path already uses forward slashes, so plain concatenation is enough
+                add_candidate((file_path, display_prefix + relative_path))
+
+            # --- File Processing ---
+            # Reads run concurrently in worker threads; results come back in traversal
+            # order and all writes stay on this thread, so the output order is unchanged.
+            results = read_files_ahead([file_path for file_path, _ in candidates])
+            for (file_path, output_display_path), (content, encoding_used, read_error) in zip(candidates, results):
+                if encoding_used == 'binary':
+                    print(f"Skipping binary file: {output_display_path}")
+                    continue
+                print(f"Processing: {output_display_path}") # Use the new path for logging too
+                try:
+                    if encoding_used == 'latin-1':
+                        print(f"  Warning: Could not decode {output_display_path} as UTF-8. Trying latin-1...")
+                    if read_error is not None:
+                        print(f"  Error reading file {output_display_path}: {read_error}")
+                        content = f"[Error reading file: {read_error}]".encode('utf-8')
+
+                    if content is None:
+                        content, line_end = b"[Error: Could not read file content]", b""
+                    else:
+                        line_end = b"" if content.endswith(b'\n') else b"\n"
+                    # Header and body go out in a single write call
+                    # Use the NEW output_display_path here
+                    write(b"".join((header_prefix, output_display_path.encode('utf-8'),
+                                    header_suffix, content, line_end, b"\n")))
+                    collected_count += 1
+
+                except Exception as e:
+                    print(f"  Unexpected error processing file {output_display_path}: {e}")
                     try:
-                        content = None
-                        try:
-                            with open(file_path, 'r', encoding='utf-8', errors='strict') as infile:
-                                content = infile.read()
-                        except UnicodeDecodeError:
-                            try:
-                                print(f"  Warning: Could not decode {output_display_path} as UTF-8. Trying latin-1...")
-                                with open(file_path, 'r', encoding='latin-1', errors='ignore') as infile:
-                                     content = infile.read()
-                            except Exception as inner_e:
-                                print(f"  Error reading file {output_display_path} even with fallback: {inner_e}")
-                                content = f"[Error reading file content: {inner_e}]"
-                        except Exception as e: # Catch other file reading errors (permissions etc.)
-                             print(f"  Error reading file {output_display_path}: {e}")
-                             content = f"[Error reading file: {e}]"
-
-
-                        outfile.write("=" * 70 + "\n")
-                        # Use the NEW output_display_path here
-                        outfile.write(f"File: {output_display_path}\n")
-                        outfile.write("=" * 70 + "\n")
-                        outfile.write(content if content is not None else "[Error: Could not read file content]")
-                        if content is not None and not content.endswith('\n'):
-                             outfile.write("\n")
-                        outfile.write("\n")
-                        collected_count += 1
-
-                    except Exception as e:
-                        print(f"  Unexpected error processing file {output_display_path}: {e}")
-                        try:
-                            outfile.write("=" * 70 + "\n")
-                            outfile.write(f"File: {output_display_path}\n")
-                            outfile.write("=" * 70 + "\n")
-                            outfile.write(f"[Unexpected error during processing: {e}]\n\n")
-                        except Exception:
-                             print(f"  Critical: Failed to write error message for {output_display_path} to output file.")
+                        write(f"{FILE_SEPARATOR}File: {output_display_path}\n{FILE_SEPARATOR}"
+                              f"[Unexpected error during processing: {e}]\n\n".encode('utf-8'))
+                    except Exception:
+                         print(f"  Critical: Failed to write error message for {output_display_path} to output file.")
 
 
     except IOError as e:
@@ -270,10 +514,11 @@ def collect_code(root_dir, output_file, ignored_folders, ignored_patterns):
     return True
 
 if __name__ == "__main__":
-    ignored_folders, ignored_patterns = load_ignore_config(
+    ignored_folders, ignored_patterns, ignore_matcher, max_file_size = load_ignore_config(
         os.path.join(ROOT_DIR, CONFIG_FILENAME),
         DEFAULT_IGNORED_FOLDERS,
-        DEFAULT_IGNORED_PATTERNS
+        DEFAULT_IGNORED_PATTERNS,
+        MAX_FILE_SIZE
     )
 
-    collect_code(ROOT_DIR, OUTPUT_FILENAME, ignored_folders, ignored_patterns)
\ No newline at end of file
+    collect_code(ROOT_DIR, OUTPUT_FILENAME, ignored_folders, ignored_patterns, ignore_matcher, max_file_size)
\ No newline at end of file